@@ -1,14 +1,63 @@
 import asyncio
 import os
 from collections.abc import AsyncGenerator, Generator
+from contextlib import aclosing, closing
 from typing import Any
 
+import ijson
+import orjson
+
 from graphrag.language_model.providers.hiagent.client import HiAgentLLMClient
 from graphrag.language_model.response.base import (BaseModelOutput,
                                                    BaseModelResponse,
                                                    ModelResponse)
 
 
+def _message_answer(data: dict[str, Any]) -> str:
+    """Return the answer text carried by a streamed message event, if any."""
+    if data.get("event") == "message":
+        return data.get("answer", "")
+    return ""
+
+
+class _PartialJSONObject:
+    """Incrementally parse a streamed JSON object as its top-level values close.
+
+    Text that is not a bare JSON object, such as a markdown fence or prose after
+    the closing brace, stops the parse: `failed` is set instead of raising.
+    """
+
+    def __init__(self):
+        self._items = ijson.sendable_list()
+        # Floats, like orjson in chat(json=True), rather than ijson's Decimal.
+        self._parser = ijson.kvitems_coro(self._items, "", use_float=True)
+        self.value: dict[str, Any] = {}
+        self.failed = False
+
+    def _collect(self) -> bool:
+        if not self._items:
+            return False
+        self.value.update(self._items)
+        del self._items[:]
+        return True
+
+    def feed(self, chunk: str) -> bool:
+        """Feed a text chunk; return True if new top-level keys were completed."""
+        try:
+            self._parser.send(chunk.encode())
+        except ijson.JSONError:
+            self.failed = True
+        return self._collect()
+
+    def close(self) -> bool:
+        """Finish parsing; return True if the last top-level keys were completed."""
+        try:
+            self._parser.close()
+        except ijson.JSONError:
+            self.failed = True
+        return self._collect()
+
+
 class HiAgentChatLLM:
     """HiAgent LLM provider for GraphRAG."""
 
@@ -32,16 +81,68 @@ class HiAgentChatLLM:
         )
         self.user_id = "graphrag_user"
         self.conversation_inputs = conversation_inputs or {}
-        self._conversation_created = False
+        self._conversation_lock: asyncio.Lock | None = None
+        self._conversation_lock_loop: asyncio.AbstractEventLoop | None = None
+
+    @staticmethod
+    def _conversation_ready():
+        """Do nothing; the conversation has already been created."""
+
+    @staticmethod
+    async def _aconversation_ready():
+        """Do nothing; the conversation has already been created."""
+
+    def _get_conversation_lock(self) -> asyncio.Lock:
+        # A lock is tied to the event loop it first waits on, so each running
+        # loop (e.g. successive asyncio.run calls) gets its own.
+        loop = asyncio.get_running_loop()
+        if self._conversation_lock is None or self._conversation_lock_loop is not loop:
+            self._conversation_lock = asyncio.Lock()
+            self._conversation_lock_loop = loop
+        return self._conversation_lock
+
+    def _mark_conversation_ready(self):
+        # Shadow both ensure methods on the instance so later calls skip the check.
+        self._ensure_conversation = self._conversation_ready
+        self._aensure_conversation = self._aconversation_ready
 
     def _ensure_conversation(self):
         """Ensure that the conversation has been created."""
-        if not self._conversation_created:
-            self.client.create_conversation(
+        self.client.create_conversation(
+            user_id=self.user_id,
+            inputs=self.conversation_inputs,
+        )
+        self._mark_conversation_ready()
+
+    async def _aensure_conversation(self):
+        """Ensure that the conversation has been created, without blocking the loop."""
+        # Concurrent first calls, e.g. from batch_achat, share a single creation.
+        async with self._get_conversation_lock():
+            if self._ensure_conversation is self._conversation_ready:
+                return
+            await self.client.acreate_conversation(
                 user_id=self.user_id,
                 inputs=self.conversation_inputs,
             )
-            self._conversation_created = True
+            self._mark_conversation_ready()
+
+    def _to_model_response(self, content: str, **kwargs) -> ModelResponse:
+        """Convert a blocking HiAgent chat answer into a ModelResponse."""
+        parsed_json = None
+        if kwargs.get("json", False):
+            try:
+                parsed_json = orjson.loads(content)
+            except orjson.JSONDecodeError:
+                pass
+
+        return BaseModelResponse(
+            output=BaseModelOutput(content=content),
+            parsed_response=parsed_json,
+        )
+
+    async def aclose(self) -> None:
+        """Close the connections held by this provider's async client."""
+        await self.client.aclose()
 
     async def achat(
         self,
@@ -60,11 +161,48 @@ class HiAgentChatLLM:
         Returns:
             ModelResponse: Model response
         """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None, lambda: self.chat(prompt, history, **kwargs)
+        await self._aensure_conversation()
+
+        query_extends = kwargs.get("query_extends")
+        content = await self.client.achat_query_answer(
+            query=prompt,
+            query_extends=query_extends,
         )
 
+        return self._to_model_response(content, **kwargs)
+
+    async def batch_achat(
+        self,
+        prompts: list[str],
+        max_concurrency: int = 16,
+        **kwargs,
+    ) -> list[ModelResponse]:
+        """
+        Send several asynchronous chat requests concurrently.
+
+        Args:
+            prompts: User input prompts
+            max_concurrency: Maximum number of requests in flight at once
+            **kwargs: Additional parameters passed to each achat call
+
+        Returns:
+            list[ModelResponse]: Model responses, in the same order as prompts
+
+        Raises:
+            ValueError: If max_concurrency is not greater than 0
+        """
+        if max_concurrency < 1:
+            msg = "max_concurrency must be greater than 0."
+            raise ValueError(msg)
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _achat(prompt: str) -> ModelResponse:
+            async with semaphore:
+                return await self.achat(prompt, **kwargs)
+
+        return await asyncio.gather(*(_achat(prompt) for prompt in prompts))
+
     async def achat_stream(
         self,
         prompt: str,
@@ -82,24 +220,16 @@ class HiAgentChatLLM:
         Yields:
             str: Streamed text chunks from the response
         """
-        self._ensure_conversation()
+        await self._aensure_conversation()
         query_extends = kwargs.get("query_extends")
 
-        loop = asyncio.get_event_loop()
-
-        def stream_generator():
-            for data in self.client.chat_query_streaming(
-                query=prompt,
-                query_extends=query_extends,
-                chunk_size=kwargs.get("chunk_size", 1),
-            ):
-                if data.get("event") == "message":
-                    answer = data.get("answer", "")
-                    if answer:
-                        yield answer
-
-        for chunk in await loop.run_in_executor(None, list, stream_generator()):
-            yield chunk
+        async for data in self.client.achat_query_streaming(
+            query=prompt,
+            query_extends=query_extends,
+        ):
+            answer = _message_answer(data)
+            if answer:
+                yield answer
 
     def chat(
         self,
@@ -121,26 +251,12 @@ class HiAgentChatLLM:
         self._ensure_conversation()
 
         query_extends = kwargs.get("query_extends")
-        response = self.client.chat_query_blocking(
+        content = self.client.chat_query_answer(
             query=prompt,
             query_extends=query_extends,
         )
 
-        content = response.get("answer", "")
-
-        parsed_json = None
-        if kwargs.get("json", False):
-            try:
-                import json
-
-                parsed_json = json.loads(content)
-            except json.JSONDecodeError:
-                pass
-
-        return BaseModelResponse(
-            output=BaseModelOutput(content=content),
-            parsed_response=parsed_json,
-        )
+        return self._to_model_response(content, **kwargs)
 
     def chat_stream(
         self,
@@ -165,9 +281,65 @@ class HiAgentChatLLM:
         for data in self.client.chat_query_streaming(
             query=prompt,
             query_extends=query_extends,
-            chunk_size=kwargs.get("chunk_size", 1),
         ):
-            if data.get("event") == "message":
-                answer = data.get("answer", "")
-                if answer:
-                    yield answer
+            answer = _message_answer(data)
+            if answer:
+                yield answer
+
+    async def achat_json_stream(
+        self,
+        prompt: str,
+        history: list | None = None,
+        **kwargs,
+    ) -> AsyncGenerator[dict[str, Any], None]:
+        """
+        Stream an asynchronous chat response that is expected to be a JSON object.
+
+        Args:
+            prompt: User input prompt
+            history: Conversation history
+            **kwargs: Additional parameters
+
+        Yields:
+            dict: The object parsed so far, each time a top-level key completes.
+                The stream ends early, without raising, once the answer is no
+                longer a bare JSON object (e.g. a ```json fence or trailing prose).
+        """
+        partial = _PartialJSONObject()
+        async with aclosing(self.achat_stream(prompt, history, **kwargs)) as chunks:
+            async for chunk in chunks:
+                if partial.feed(chunk):
+                    yield dict(partial.value)
+                if partial.failed:
+                    return
+        if partial.close():
+            yield dict(partial.value)
+
+    def chat_json_stream(
+        self,
+        prompt: str,
+        history: list | None = None,
+        **kwargs,
+    ) -> Generator[dict[str, Any], None, None]:
+        """
+        Stream a synchronous chat response that is expected to be a JSON object.
+
+        Args:
+            prompt: User input prompt
+            history: Conversation history
+            **kwargs: Additional parameters
+
+        Yields:
+            dict: The object parsed so far, each time a top-level key completes.
+                The stream ends early, without raising, once the answer is no
+                longer a bare JSON object (e.g. a ```json fence or trailing prose).
+        """
+        partial = _PartialJSONObject()
+        with closing(self.chat_stream(prompt, history, **kwargs)) as chunks:
+            for chunk in chunks:
+                if partial.feed(chunk):
+                    yield dict(partial.value)
+                if partial.failed:
+                    return
+        if partial.close():
+            yield dict(partial.value)
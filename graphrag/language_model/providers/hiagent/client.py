@@ -1,12 +1,121 @@
-import json
+import asyncio
 import logging
+import socket
 import time
-from typing import Any, Callable, Dict, Generator, Optional
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterable,
+    Callable,
+    ClassVar,
+    Dict,
+    Generator,
+    Iterable,
+    Optional,
+)
+from urllib.request import getproxies, proxy_bypass
 
-import requests
+import httpx
+import ijson
+import orjson
+
+_STREAM_HEADERS = {
+    "Accept": "text/event-stream",
+    "Cache-Control": "no-cache",
+}
+
+# Disable Nagle so small SSE token frames are not held back waiting on delayed
+# ACKs, and keep idle pooled connections alive at the TCP level.
+_SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+# Sync clients shared by every HiAgentLLMClient talking to the same api_url, so
+# new providers reuse pooled TLS connections instead of handshaking again.
+_SESSIONS: Dict[str, httpx.Client] = {}
+
+
+def _env_proxy(api_url: str) -> Optional[str]:
+    # An explicit transport turns off httpx's own environment proxy lookup, so
+    # resolve HTTP(S)_PROXY / ALL_PROXY / NO_PROXY for api_url the same way.
+    url = httpx.URL(api_url)
+    if proxy_bypass(url.host):
+        return None
+    proxies = getproxies()
+    proxy = proxies.get(url.scheme) or proxies.get("all")
+    if proxy and "://" not in proxy:
+        proxy = f"http://{proxy}"
+    return proxy
+
+
+def _build_session(api_url: str) -> httpx.Client:
+    transport = httpx.HTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        socket_options=_SOCKET_OPTIONS,
+        proxy=_env_proxy(api_url),
+    )
+    return httpx.Client(
+        base_url=api_url,
+        headers={"Content-Type": "application/json"},
+        timeout=httpx.Timeout(30.0),
+        transport=transport,
+    )
+
+
+def _get_session(api_url: str) -> httpx.Client:
+    session = _SESSIONS.get(api_url)
+    if session is None:
+        session = _SESSIONS[api_url] = _build_session(api_url)
+    return session
+
+
+def _split_sse_lines(pending: list[bytes], chunk: bytes) -> list[bytes]:
+    # SSE lines end in CR, LF or CRLF, which is exactly what bytes.splitlines
+    # recognises; JSON payloads cannot contain raw line breaks. Pieces of a line
+    # that span reads are collected in pending and joined once, when its line
+    # break arrives, so a large event is never re-copied or rescanned per read.
+    end = max(chunk.rfind(b"\n"), chunk.rfind(b"\r")) + 1
+    if not end:
+        pending.append(chunk)
+        return []
+
+    head = chunk[:end]
+    if pending:
+        pending.append(head)
+        head = b"".join(pending)
+        pending.clear()
+    if end < len(chunk):
+        pending.append(chunk[end:])
+    return head.splitlines(keepends=True)
+
+
+def _iter_sse_lines(chunks: Iterable[bytes]) -> Generator[bytes, None, None]:
+    pending: list[bytes] = []
+    for chunk in chunks:
+        yield from _split_sse_lines(pending, chunk)
+    if pending:
+        yield b"".join(pending)
+
+
+async def _aiter_sse_lines(
+    chunks: AsyncIterable[bytes],
+) -> AsyncGenerator[bytes, None]:
+    pending: list[bytes] = []
+    async for chunk in chunks:
+        for line in _split_sse_lines(pending, chunk):
+            yield line
+    if pending:
+        yield b"".join(pending)
 
 
 class HiAgentLLMClient:
+    # Conversations created in this process, keyed by (api_key, user_id, inputs),
+    # so new clients can skip the create_conversation round-trip.
+    _CONV_CACHE: ClassVar[Dict[tuple[str, str, bytes], Dict[str, Any]]] = {}
+
     app_conversation_id: str
     user_id: str
 
@@ -15,180 +124,370 @@ class HiAgentLLMClient:
         api_url: str,
         api_key: str,
         user_agent: str,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None,
     ) -> None:
         self.api_url: str = api_url
         self.api_key: str = api_key
         self.user_agent: str = user_agent
-        self.session: requests.Session = requests.Session()
-        self.session.headers.update(
+        self.headers: Dict[str, str] = {
+            "Apikey": api_key,
+            "Content-Type": "application/json",
+            "User-Agent": user_agent,
+        }
+        self.session: httpx.Client = _get_session(api_url)
+        self._stream_headers: Dict[str, str] = {**self.headers, **_STREAM_HEADERS}
+        self.async_transport: Optional[httpx.AsyncBaseTransport] = async_transport
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _build_aclient(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.api_url,
+            headers=self.headers,
+            http2=True,
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            transport=self.async_transport,
+        )
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        # Pooled connections belong to the event loop that opened them, so each
+        # running loop (e.g. successive asyncio.run calls) gets its own client.
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = self._build_aclient()
+            self._aclient_loop = loop
+        return self._aclient
+
+    async def aclose(self) -> None:
+        # Only the async client is owned by this instance; the sync session is
+        # shared per api_url and outlives it. A client left over from a loop
+        # that has since closed is simply dropped with it.
+        aclient, self._aclient = self._aclient, None
+        if aclient is not None and self._aclient_loop is asyncio.get_running_loop():
+            await aclient.aclose()
+
+    async def __aenter__(self) -> "HiAgentLLMClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+    def _chat_payload_prefix(self, response_mode: str) -> bytes:
+        # Serialized once per conversation with the closing brace stripped, so
+        # each chat query only has to encode its own Query and QueryExtends.
+        return orjson.dumps(
             {
-                "Apikey": api_key,
-                "Content-Type": "application/json",
-                "User-Agent": user_agent,
+                "AppKey": self.api_key,
+                "AppConversationID": self.app_conversation_id,
+                "UserID": self.user_id,
+                "ResponseMode": response_mode,
             }
+        )[:-1]
+
+    @staticmethod
+    def _chat_payload(
+        prefix: bytes,
+        query: str,
+        query_extends: Optional[Dict[str, Any]],
+    ) -> bytes:
+        return b"".join(
+            (
+                prefix,
+                b',"Query":',
+                orjson.dumps(query),
+                b',"QueryExtends":',
+                orjson.dumps(query_extends),
+                b"}",
+            )
         )
 
+    def _conversation_cache_key(
+        self, user_id: str, inputs: Dict[str, Any]
+    ) -> tuple[str, str, bytes]:
+        return (
+            self.api_key,
+            user_id,
+            orjson.dumps(inputs, option=orjson.OPT_SORT_KEYS),
+        )
+
+    def _conversation_request(
+        self, user_id: str, inputs: Dict[str, Any]
+    ) -> tuple[str, Dict[str, Any]]:
+        url = "/api/proxy/api/v1/create_conversation"
+        payload = {
+            "AppKey": self.api_key,
+            "Inputs": inputs,
+            "UserID": user_id,
+        }
+        return url, payload
+
+    def _use_conversation(
+        self,
+        cache_key: tuple[str, str, bytes],
+        user_id: str,
+        conversation: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        self.app_conversation_id = conversation["Conversation"]["AppConversationID"]
+        self.user_id = user_id
+        self._blocking_prefix = self._chat_payload_prefix("blocking")
+        self._streaming_prefix = self._chat_payload_prefix("streaming")
+        self._CONV_CACHE[cache_key] = conversation
+        return conversation
+
     def create_conversation(
         self,
         user_id: str,
         inputs: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        url = f"{self.api_url}/api/proxy/api/v1/create_conversation"
-        payload = {
-            "AppKey": self.api_key,
-            "Inputs": inputs or {},
-            "UserID": user_id,
-        }
+        inputs = inputs or {}
+        cache_key = self._conversation_cache_key(user_id, inputs)
+        conversation = self._CONV_CACHE.get(cache_key)
+        if conversation is None:
+            url, payload = self._conversation_request(user_id, inputs)
+            try:
+                response = self.session.post(
+                    url, json=payload, headers=self.headers, timeout=10
+                )
+                response.raise_for_status()
+                conversation = orjson.loads(response.content)
+            except httpx.HTTPError as e:
+                logging.error(f"Error creating conversation: {e}")
+                raise
+
+        return self._use_conversation(cache_key, user_id, conversation)
+
+    async def acreate_conversation(
+        self,
+        user_id: str,
+        inputs: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        inputs = inputs or {}
+        cache_key = self._conversation_cache_key(user_id, inputs)
+        conversation = self._CONV_CACHE.get(cache_key)
+        if conversation is None:
+            url, payload = self._conversation_request(user_id, inputs)
+            try:
+                response = await self.aclient.post(url, json=payload, timeout=10)
+                response.raise_for_status()
+                conversation = orjson.loads(response.content)
+            except httpx.HTTPError as e:
+                logging.error(f"Error creating conversation: {e}")
+                raise
+
+        return self._use_conversation(cache_key, user_id, conversation)
+
+    def chat_query_blocking(
+        self,
+        query: str,
+        query_extends: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any] | Any:
+        url = "/api/proxy/api/v1/chat_query_v2"
+        payload = self._chat_payload(self._blocking_prefix, query, query_extends)
         try:
-            response = self.session.post(url, json=payload, timeout=10)
-            response.raise_for_status()
-            self.app_conversation_id = (
-                response.json().get("Conversation").get("AppConversationID")
+            response = self.session.post(
+                url, content=payload, headers=self.headers, timeout=None
             )
-            self.user_id = user_id
-            return response.json()
-        except requests.RequestException as e:
-            logging.error(f"Error creating conversation: {e}")
+            response.raise_for_status()
+            return orjson.loads(response.content)
+        except httpx.HTTPError as e:
+            logging.error(f"Error during chat query: {e}")
             raise
 
-    def chat_query_blocking(
+    async def achat_query_blocking(
         self,
         query: str,
         query_extends: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any] | Any:
-        url = f"{self.api_url}/api/proxy/api/v1/chat_query_v2"
-        payload = {
-            "Query": query,
-            "AppConversationID": self.app_conversation_id,
-            "AppKey": self.api_key,
-            "ResponseMode": "blocking",
-            "UserID": self.user_id,
-            "QueryExtends": query_extends,
-        }
+        url = "/api/proxy/api/v1/chat_query_v2"
+        payload = self._chat_payload(self._blocking_prefix, query, query_extends)
         try:
-            response = self.session.post(url, json=payload)
+            response = await self.aclient.post(url, content=payload, timeout=None)
             response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            return orjson.loads(response.content)
+        except httpx.HTTPError as e:
+            logging.error(f"Error during chat query: {e}")
+            raise
+
+    def chat_query_answer(
+        self,
+        query: str,
+        query_extends: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        # Blocking query that only parses the body up to the "answer" value. The
+        # rest is still read, undecoded, so HTTP/1.1 connections can go back to
+        # the pool instead of being dropped with an unread body.
+        url = "/api/proxy/api/v1/chat_query_v2"
+        payload = self._chat_payload(self._blocking_prefix, query, query_extends)
+        answers = ijson.sendable_list()
+        parser = ijson.items_coro(answers, "answer")
+        try:
+            with self.session.stream(
+                "POST", url, content=payload, headers=self.headers, timeout=None
+            ) as response:
+                response.raise_for_status()
+                for chunk in response.iter_bytes():
+                    if not answers:
+                        parser.send(chunk)
+            if not answers:
+                parser.close()
+        except httpx.HTTPError as e:
+            logging.error(f"Error during chat query: {e}")
+            raise
+        return answers[0] if answers else ""
+
+    async def achat_query_answer(
+        self,
+        query: str,
+        query_extends: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        url = "/api/proxy/api/v1/chat_query_v2"
+        payload = self._chat_payload(self._blocking_prefix, query, query_extends)
+        answers = ijson.sendable_list()
+        parser = ijson.items_coro(answers, "answer")
+        try:
+            async with self.aclient.stream(
+                "POST", url, content=payload, timeout=None
+            ) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    if not answers:
+                        parser.send(chunk)
+            if not answers:
+                parser.close()
+        except httpx.HTTPError as e:
             logging.error(f"Error during chat query: {e}")
             raise
+        return answers[0] if answers else ""
 
     def chat_query_streaming(
         self,
         query: str,
         query_extends: Optional[Dict[str, Any]] = None,
         on_message: Optional[Callable] = None,
-        chunk_size: int = 1,
         debug: bool = False,
     ) -> Generator[Dict[str, Any], None, None]:
-        url = f"{self.api_url}/api/proxy/api/v1/chat_query_v2"
-        payload = {
-            "Query": query,
-            "AppConversationID": self.app_conversation_id,
-            "AppKey": self.api_key,
-            "ResponseMode": "streaming",
-            "UserID": self.user_id,
-            "QueryExtends": query_extends,
-        }
+        url = "/api/proxy/api/v1/chat_query_v2"
+        payload = self._chat_payload(self._streaming_prefix, query, query_extends)
 
         try:
             start_time = time.time()
-            response = self.session.post(
-                url,
-                json=payload,
-                stream=True,
-                timeout=30,
-                headers={
-                    "Connection": "keep-alive",
-                    "Accept": "text/event-stream",
-                    "Cache-Control": "no-cache",
-                },
+            with self.session.stream(
+                "POST", url, content=payload, headers=self._stream_headers
+            ) as response:
+                response.raise_for_status()
+
+                if debug:
+                    yield from self._stream_debug(response, on_message, start_time)
+                else:
+                    yield from self._stream_fast(response, on_message)
+
+        except httpx.HTTPError as e:
+            logging.error(f"Error during streaming chat query: {e}")
+            raise
+
+    @staticmethod
+    def _stream_fast(
+        response: httpx.Response,
+        on_message: Optional[Callable],
+    ) -> Generator[Dict[str, Any], None, None]:
+        for line_bytes in _iter_sse_lines(response.iter_bytes()):
+            if not line_bytes.startswith(b"data:"):
+                continue
+
+            # orjson takes bytes and skips surrounding whitespace, "\r"
+            # included, so the line is never decoded or stripped.
+            try:
+                data = orjson.loads(line_bytes[5:])
+            except orjson.JSONDecodeError:
+                continue
+
+            if on_message:
+                on_message(data)
+            yield data
+
+    @staticmethod
+    def _stream_debug(
+        response: httpx.Response,
+        on_message: Optional[Callable],
+        start_time: float,
+    ) -> Generator[Dict[str, Any], None, None]:
+        event_count = 0
+        last_event_time = start_time
+
+        for line_bytes in _iter_sse_lines(response.iter_bytes()):
+            current_time = time.time()
+            time_since_last = current_time - last_event_time
+            print(
+                f"\n[DEBUG] Received line: {len(line_bytes)} bytes, "
+                f"time since last: {time_since_last:.3f}s"
             )
-            response.raise_for_status()
+            last_event_time = current_time
 
-            buffer = b""
-            event_count = 0
-            last_event_time = start_time
+            if not line_bytes.startswith(b"data:"):
+                continue
 
-            for chunk in response.iter_content(
-                chunk_size=chunk_size, decode_unicode=False
-            ):
-                if not chunk:
-                    continue
+            payload_bytes = line_bytes[5:]
+            try:
+                data = orjson.loads(payload_bytes)
+            except orjson.JSONDecodeError:
+                print(f"[DEBUG] JSONDecodeError: {payload_bytes[:100]!r}...")
+                continue
 
-                if debug:
-                    current_time = time.time()
-                    time_since_last = current_time - last_event_time
-                    print(
-                        f"\n[DEBUG] Received chunk: {len(chunk)} bytes, "
-                        f"time since last: {time_since_last:.3f}s"
-                    )
-                    last_event_time = current_time
+            event_count += 1
+            answer = data.get("answer", "")
+            print(
+                f"[DEBUG] Event #{event_count}: "
+                f"type={data.get('event')}, "
+                f"answer_len={len(answer)}, "
+                f"content='{answer}'"
+            )
 
-                buffer += chunk
+            if on_message:
+                on_message(data)
+            yield data
 
-                while b"\n" in buffer:
-                    line_bytes, buffer = buffer.split(b"\n", 1)
+        total_time = time.time() - start_time
+        print(
+            f"\n[DEBUG] Stream completed: {event_count} events, "
+            f"total time: {total_time:.3f}s"
+        )
 
-                    try:
-                        line = line_bytes.decode("utf-8").strip()
-                    except UnicodeDecodeError:
-                        if debug:
-                            print("[DEBUG] UnicodeDecodeError, continuing...")
+    async def achat_query_streaming(
+        self,
+        query: str,
+        query_extends: Optional[Dict[str, Any]] = None,
+        on_message: Optional[Callable] = None,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        url = "/api/proxy/api/v1/chat_query_v2"
+        payload = self._chat_payload(self._streaming_prefix, query, query_extends)
+
+        try:
+            async with self.aclient.stream(
+                "POST", url, content=payload, headers=_STREAM_HEADERS
+            ) as response:
+                response.raise_for_status()
+
+                async for line_bytes in _aiter_sse_lines(response.aiter_bytes()):
+                    if not line_bytes.startswith(b"data:"):
                         continue
 
-                    if not line:
+                    try:
+                        data = orjson.loads(line_bytes[5:])
+                    except orjson.JSONDecodeError:
                         continue
 
-                    if line.startswith("data:"):
-                        data_str = line[5:].strip()
-                        try:
-                            data = json.loads(data_str)
-                            event_count += 1
-
-                            if debug:
-                                answer = data.get("answer", "")
-                                print(
-                                    f"[DEBUG] Event #{event_count}: "
-                                    f"type={data.get('event')}, "
-                                    f"answer_len={len(answer)}, "
-                                    f"content='{answer}'"
-                                )
-
-                            if on_message:
-                                on_message(data)
-                            yield data
-
-                        except json.JSONDecodeError:
-                            if debug:
-                                print(f"[DEBUG] JSONDecodeError: {data_str[:100]}...")
-                            continue
-
-            if buffer:
-                try:
-                    line = buffer.decode("utf-8").strip()
-                    if line.startswith("data:"):
-                        data_str = line[5:].strip()
-                        data = json.loads(data_str)
-                        if on_message:
-                            on_message(data)
-                        yield data
-                except (UnicodeDecodeError, json.JSONDecodeError):
-                    pass
-
-            if debug:
-                total_time = time.time() - start_time
-                print(
-                    f"\n[DEBUG] Stream completed: {event_count} events, "
-                    f"total time: {total_time:.3f}s"
-                )
+                    if on_message:
+                        on_message(data)
+                    yield data
 
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logging.error(f"Error during streaming chat query: {e}")
             raise
 
     def get_conversation_messages(self, limit: int) -> Dict[str, Any]:
-        url = f"{self.api_url}/api/proxy/api/v1/get_conversation_messages"
+        url = "/api/proxy/api/v1/get_conversation_messages"
         payload = {
             "AppKey": self.api_key,
             "UserID": self.user_id,
@@ -196,31 +495,35 @@ class HiAgentLLMClient:
             "Limit": limit,
         }
         try:
-            response = self.session.post(url, json=payload, timeout=10)
+            response = self.session.post(
+                url, json=payload, headers=self.headers, timeout=10
+            )
             response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            return orjson.loads(response.content)
+        except httpx.HTTPError as e:
             logging.error(f"Error getting conversation messages: {e}")
             raise
 
     def get_message_info(self, message_id: str) -> Dict[str, Any]:
-        url = f"{self.api_url}/api/proxy/api/v1/get_message_info"
+        url = "/api/proxy/api/v1/get_message_info"
         payload = {
             "AppKey": self.api_key,
             "UserID": self.user_id,
             "MessageID": message_id,
         }
         try:
-            response = self.session.post(url, json=payload, timeout=10)
+            response = self.session.post(
+                url, json=payload, headers=self.headers, timeout=10
+            )
             response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            return orjson.loads(response.content)
+        except httpx.HTTPError as e:
             logging.error(f"Error getting message info: {e}")
             raise
 
     # TODO: TO BE TESTED
     def run_app_workflow(self, input: Dict[str, Any], app_id: str) -> Dict[str, Any]:
-        url = f"{self.api_url}/api/proxy/api/v1/run_app_workflow"
+        url = "/api/proxy/api/v1/run_app_workflow"
         payload = {
             "AppKey": self.api_key,
             "UserID": self.user_id,
@@ -228,11 +531,13 @@ class HiAgentLLMClient:
             "AppID": app_id,
         }
         try:
-            response = self.session.post(url, json=payload, timeout=10)
+            response = self.session.post(
+                url, json=payload, headers=self.headers, timeout=10
+            )
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
 
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logging.error(f"Error running app workflow: {e}")
             raise
 
@@ -240,7 +545,7 @@ class HiAgentLLMClient:
     def query_run_app_process(
         self, input: Dict[str, Any], app_id: str
     ) -> Dict[str, Any]:
-        url = f"{self.api_url}/api/proxy/api/v1/query_run_app_process"
+        url = "/api/proxy/api/v1/query_run_app_process"
         payload = {
             "AppKey": self.api_key,
             "UserID": self.user_id,
@@ -248,10 +553,12 @@ class HiAgentLLMClient:
             "AppID": app_id,
         }
         try:
-            response = self.session.post(url, json=payload, timeout=10)
+            response = self.session.post(
+                url, json=payload, headers=self.headers, timeout=10
+            )
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
 
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logging.error(f"Error running app workflow: {e}")
             raise
@@ -0,0 +1,429 @@
+# Copyright (c) 2024 Microsoft Corporation.
+# Licensed under the MIT License
+
+"""Test the HiAgent chat provider."""
+
+import asyncio
+import json
+import threading
+from collections.abc import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, cast
+
+import httpx
+import pytest
+
+from graphrag.language_model.providers.hiagent.chat_model import HiAgentChatLLM
+from graphrag.language_model.providers.hiagent.client import HiAgentLLMClient
+
+API_URL = "https://hiagent.test"
+ANSWER_CHUNKS = ["Hello", ", ", "world"]
+JSON_ANSWER_CHUNKS = [
+    '{"ti',
+    'tle": "A", "n',
+    'ums": [1,',
+    "2]",
+    ', "x": {"y": 1}',
+    "}",
+]
+
+
+@pytest.fixture(autouse=True)
+def _clear_conversation_cache() -> None:
+    # Conversations are cached process-wide; start every test without one.
+    HiAgentLLMClient._CONV_CACHE.clear()  # noqa: SLF001
+
+
+def _sse_body(chunks: list[str]) -> bytes:
+    events = [{"event": "message", "answer": chunk} for chunk in chunks]
+    events.append({"event": "message_end"})
+    return b"".join(f"data: {json.dumps(event)}\n\n".encode() for event in events)
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("create_conversation"):
+        return httpx.Response(
+            200, json={"Conversation": {"AppConversationID": "conversation-id"}}
+        )
+
+    payload = json.loads(request.content)
+    assert payload["AppConversationID"] == "conversation-id"
+    if payload["ResponseMode"] == "blocking":
+        answer = json.dumps({"query": payload["Query"]})
+        return httpx.Response(200, json={"answer": answer})
+    return httpx.Response(
+        200,
+        content=_sse_body(ANSWER_CHUNKS),
+        headers={"Content-Type": "text/event-stream"},
+    )
+
+
+def _create_model(
+    handler: Callable[[httpx.Request], httpx.Response] = _handler,
+) -> HiAgentChatLLM:
+    model = HiAgentChatLLM(api_key="test-key")
+    transport = httpx.MockTransport(handler)
+    model.client.session = httpx.Client(base_url=API_URL, transport=transport)
+    model.client.async_transport = transport
+    return model
+
+
+def _create_model_with_body(content: Any) -> HiAgentChatLLM:
+    """Create a model whose chat queries all respond with the given body."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("create_conversation"):
+            return _handler(request)
+        return httpx.Response(200, content=content)
+
+    return _create_model(handler)
+
+
+def test_chat():
+    response = _create_model().chat("ping")
+
+    assert response.output.content == '{"query": "ping"}'
+    assert response.parsed_response is None
+
+
+def test_chat_does_not_parse_metadata_after_answer():
+    model = _create_model_with_body([b'{"answer": "pong", ', b'"Usage": <not json>'])
+
+    assert model.chat("ping").output.content == "pong"
+
+
+class _CountingServer(ThreadingHTTPServer):
+    connections: int = 0
+
+    def finish_request(self, request, client_address):
+        # Called once per accepted connection, however many requests it serves.
+        self.connections += 1
+        super().finish_request(request, client_address)
+
+
+class _CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path.endswith("create_conversation"):
+            body = {"Conversation": {"AppConversationID": "conversation-id"}}
+        else:
+            body = {"answer": "pong", "Usage": {"TotalTokens": 1}}
+        content = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+
+@pytest.fixture
+def http1_server() -> Iterator[_CountingServer]:
+    server = _CountingServer(("127.0.0.1", 0), _CountingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _create_http1_model(server: _CountingServer) -> HiAgentChatLLM:
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    model = HiAgentChatLLM(api_key="test-key")
+    model.client.api_url = base_url
+    model.client.session = httpx.Client(base_url=base_url)
+    return model
+
+
+def test_chat_reuses_http1_connection(http1_server: _CountingServer):
+    model = _create_http1_model(http1_server)
+    model.chat("ping")
+    connections = http1_server.connections
+
+    for _ in range(5):
+        assert model.chat("ping").output.content == "pong"
+
+    assert http1_server.connections == connections
+
+
+async def test_achat_reuses_http1_connection(http1_server: _CountingServer):
+    model = _create_http1_model(http1_server)
+    await model.achat("ping")
+    connections = http1_server.connections
+
+    for _ in range(5):
+        assert (await model.achat("ping")).output.content == "pong"
+
+    assert http1_server.connections == connections
+
+
+def test_achat_across_event_loops(http1_server: _CountingServer):
+    model = _create_http1_model(http1_server)
+
+    for _ in range(2):
+        assert asyncio.run(model.achat("ping")).output.content == "pong"
+
+
+class _ProxyServer(ThreadingHTTPServer):
+    def __init__(self, *args: Any):
+        super().__init__(*args)
+        self.tunnels: list[str] = []
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_CONNECT(self):
+        cast("_ProxyServer", self.server).tunnels.append(self.path)
+        self.send_error(502)
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+
+@pytest.fixture
+def https_proxy(monkeypatch: pytest.MonkeyPatch) -> Iterator[_ProxyServer]:
+    server = _ProxyServer(("127.0.0.1", 0), _ProxyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    for name in ("https_proxy", "all_proxy", "ALL_PROXY", "no_proxy", "NO_PROXY"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("HTTPS_PROXY", f"http://127.0.0.1:{server.server_address[1]}")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_session_uses_environment_proxy(https_proxy: _ProxyServer):
+    client = HiAgentLLMClient("https://proxied.test", "test-key", "test")
+
+    with pytest.raises(httpx.ProxyError):
+        client.create_conversation("user")
+
+    assert https_proxy.tunnels == ["proxied.test:443"]
+
+
+def test_session_respects_no_proxy(
+    https_proxy: _ProxyServer, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setenv("NO_PROXY", "unproxied.test")
+    client = HiAgentLLMClient("https://unproxied.test", "test-key", "test")
+
+    with pytest.raises(httpx.ConnectError):
+        client.create_conversation("user")
+
+    assert https_proxy.tunnels == []
+
+
+async def test_async_client_uses_environment_proxy(https_proxy: _ProxyServer):
+    client = HiAgentLLMClient("https://async-proxied.test", "test-key", "test")
+
+    with pytest.raises(httpx.ProxyError):
+        await client.acreate_conversation("user")
+
+    assert https_proxy.tunnels == ["async-proxied.test:443"]
+
+
+def test_chat_stream():
+    assert list(_create_model().chat_stream("ping")) == ANSWER_CHUNKS
+
+
+def test_chat_query_streaming_debug(capsys: pytest.CaptureFixture[str]):
+    model = _create_model()
+    model._ensure_conversation()  # noqa: SLF001
+
+    events = list(model.client.chat_query_streaming("ping", debug=True))
+
+    assert [event.get("answer") for event in events[:-1]] == ANSWER_CHUNKS
+    assert f"Stream completed: {len(events)} events" in capsys.readouterr().out
+
+
+def test_session_is_shared_across_models():
+    first = HiAgentChatLLM(api_key="first-key")
+    second = HiAgentChatLLM(api_key="second-key")
+
+    assert first.client.session is second.client.session
+
+
+def test_conversation_is_reused_across_models():
+    created = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("create_conversation"):
+            created.append(request)
+        return _handler(request)
+
+    for _ in range(3):
+        _create_model(handler).chat("ping")
+
+    assert len(created) == 1
+
+
+def test_conversation_is_created_once_per_model():
+    created = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("create_conversation"):
+            created.append(request)
+        return _handler(request)
+
+    model = _create_model(handler)
+    model.chat("ping")
+    # Without the process-wide cache, only the rebound no-op prevents a second one.
+    HiAgentLLMClient._CONV_CACHE.clear()  # noqa: SLF001
+    model.chat("ping")
+    list(model.chat_stream("ping"))
+
+    assert len(created) == 1
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 8192])
+def test_chat_stream_reframes_network_chunks(chunk_size: int):
+    body = _sse_body(ANSWER_CHUNKS)
+    chunks = (body[i : i + chunk_size] for i in range(0, len(body), chunk_size))
+
+    model = _create_model_with_body(chunks)
+
+    assert list(model.chat_stream("ping")) == ANSWER_CHUNKS
+
+
+@pytest.mark.parametrize("line_break", [b"\r\n", b"\r"])
+async def test_achat_stream_accepts_sse_line_breaks(line_break: bytes):
+    body = _sse_body(ANSWER_CHUNKS).replace(b"\n", line_break)
+
+    async def stream_body():  # noqa: RUF029
+        for i in range(0, len(body), 5):
+            yield body[i : i + 5]
+
+    model = _create_model_with_body(stream_body())
+    chunks = [chunk async for chunk in model.achat_stream("ping")]
+
+    assert chunks == ANSWER_CHUNKS
+
+
+def test_chat_stream_skips_non_data_lines():
+    body = b": ping\n\nevent: message\n" + _sse_body(ANSWER_CHUNKS) + b": ping\n"
+
+    model = _create_model_with_body(body)
+
+    assert list(model.chat_stream("ping")) == ANSWER_CHUNKS
+
+
+async def test_achat():
+    response = await _create_model().achat("ping")
+
+    assert response.output.content == '{"query": "ping"}'
+    assert response.parsed_response is None
+
+
+async def test_aclose():
+    model = _create_model()
+    await model.achat("ping")
+    aclient = model.client.aclient
+
+    await model.aclose()
+
+    assert aclient.is_closed
+    assert model.client.aclient is not aclient
+    assert not model.client.session.is_closed
+
+
+async def test_batch_achat():
+    prompts = [f"prompt-{i}" for i in range(5)]
+
+    responses = await _create_model().batch_achat(prompts, max_concurrency=2)
+
+    assert [json.loads(r.output.content)["query"] for r in responses] == prompts
+    with pytest.raises(ValueError, match="max_concurrency"):
+        await _create_model().batch_achat(prompts, max_concurrency=0)
+
+
+async def test_batch_achat_creates_conversation_without_blocking():
+    created = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("create_conversation"):
+            created.append(request)
+        return _handler(request)
+
+    def sync_handler(request: httpx.Request) -> httpx.Response:
+        pytest.fail("async chat should not use the blocking client")
+
+    model = _create_model(handler)
+    model.client.session = httpx.Client(
+        base_url=API_URL, transport=httpx.MockTransport(sync_handler)
+    )
+
+    await model.batch_achat(["ping"] * 5)
+    chunks = [chunk async for chunk in model.achat_stream("ping")]
+
+    assert chunks == ANSWER_CHUNKS
+    assert len(created) == 1
+
+
+async def test_achat_stream():
+    chunks = [chunk async for chunk in _create_model().achat_stream("ping")]
+
+    assert chunks == ANSWER_CHUNKS
+
+
+async def test_achat_stream_yields_before_stream_ends():
+    first_chunk_received = asyncio.Event()
+
+    async def stream_body():
+        yield _sse_body(ANSWER_CHUNKS[:1])
+        # The server only continues once the caller has seen the first chunk.
+        await first_chunk_received.wait()
+        yield _sse_body(ANSWER_CHUNKS[1:])
+
+    stream = _create_model_with_body(stream_body()).achat_stream("ping")
+    first = await asyncio.wait_for(anext(stream), timeout=5)
+    first_chunk_received.set()
+    rest = [chunk async for chunk in stream]
+
+    assert [first, *rest] == ANSWER_CHUNKS
+
+
+async def test_achat_json_stream():
+    model = _create_model_with_body(_sse_body(JSON_ANSWER_CHUNKS))
+    partials = [partial async for partial in model.achat_json_stream("ping")]
+
+    assert partials[-1] == {"title": "A", "nums": [1, 2], "x": {"y": 1}}
+    assert partials[0] == {"title": "A"}
+
+
+def test_chat_json_stream():
+    model = _create_model_with_body(_sse_body(JSON_ANSWER_CHUNKS))
+    partials = list(model.chat_json_stream("ping"))
+
+    assert partials[-1] == {"title": "A", "nums": [1, 2], "x": {"y": 1}}
+    assert partials[0] == {"title": "A"}
+
+
+def test_chat_json_stream_parses_floats():
+    model = _create_model_with_body(_sse_body(['{"score": 0.', '5, "n": 2}']))
+    partials = list(model.chat_json_stream("ping"))
+
+    assert partials[-1] == {"score": 0.5, "n": 2}
+    assert isinstance(partials[-1]["score"], float)
+    json.dumps(partials[-1])
+
+
+async def test_achat_json_stream_stops_on_fenced_answer():
+    answer_chunks = ["```json\n", *JSON_ANSWER_CHUNKS, "\n```"]
+    model = _create_model_with_body(_sse_body(answer_chunks))
+
+    assert [partial async for partial in model.achat_json_stream("ping")] == []
+
+
+def test_chat_json_stream_stops_on_trailing_prose():
+    answer_chunks = [*JSON_ANSWER_CHUNKS, " Hope this helps!", " More text."]
+    model = _create_model_with_body(_sse_body(answer_chunks))
+
+    partials = list(model.chat_json_stream("ping"))
+
+    assert partials[-1] == {"title": "A", "nums": [1, 2], "x": {"y": 1}}